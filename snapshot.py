@@ -1,11 +1,22 @@
 import os
 import io
 import csv
+import asyncio
 import json
 import time
-import requests
+import random
+import operator
+import functools
+import threading
+import aiohttp
 import discord
-from datetime import datetime
+
+try:  # JSON パース高速化（未インストールなら stdlib にフォールバック）
+    import orjson
+except ImportError:
+    orjson = None
+from collections import defaultdict
+from datetime import datetime, timezone
 from typing import Tuple, Optional, Dict, Any, Callable
 
 from discord import app_commands
@@ -15,7 +26,7 @@ from dotenv import load_dotenv
 # Google Sheets
 import gspread
 from gspread.exceptions import APIError, WorksheetNotFound
-from oauth2client.service_account import ServiceAccountCredentials
+from google.oauth2.service_account import Credentials
 
 # ========= CONFIG =========
 # Check / Change ボタンでも、マスターにウォレットがあれば現在のシートへ登録するか？
@@ -31,14 +42,20 @@ API_KEY = os.getenv("API_KEY")
 SERVICE_ACCOUNT_INFO = os.getenv("SERVICE_ACCOUNT_INFO")
 
 # ========= Google Sheets Client =========
-scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
-creds_dict = json.loads(SERVICE_ACCOUNT_INFO)
-creds = ServiceAccountCredentials.from_json_keyfile_dict(creds_dict, scope)
-gc = gspread.authorize(creds)
+scope = ["https://www.googleapis.com/auth/spreadsheets", "https://www.googleapis.com/auth/drive"]
+
+@functools.cache
+def _get_gc() -> gspread.Client:
+    # google-auth は requests.Session を keep-alive で使い回すので、
+    # 呼び出し毎の TLS ハンドシェイクが消える（oauth2client は deprecated）
+    creds_dict = json.loads(SERVICE_ACCOUNT_INFO)
+    creds = Credentials.from_service_account_info(creds_dict, scopes=scope)
+    return gspread.authorize(creds)
 
-# Local (existing)
-sh = gc.open("snapshot_bot_log")
-worksheet = sh.worksheet("log")  # existing snapshot logs
+@functools.cache
+def _get_sh() -> gspread.Spreadsheet:
+    # import 時ではなく初回利用時に開く（起動時のネットワーク往復をなくす）
+    return _get_gc().open("snapshot_bot_log")
 
 # ========= Discord Bot =========
 intents = discord.Intents.default()
@@ -68,60 +85,184 @@ ALL_WALLET_SHEETS = ["wallet_log", "wallet_log2", "wallet_log3"]
 MASTER_SHEET = "wallet_master"  # 唯一ウォレットの保管先
 
 _ws_cache: Dict[str, gspread.Worksheet] = {}
-_values_cache: Dict[Tuple[str, str], Any] = {}  # (sheet_name, "all") -> values
+# (sheet_name, "all") -> (expires_at, values)。自前の書き込み時は明示的に pop して無効化する。
+VALUES_CACHE_TTL = 15.0  # seconds
+_values_cache: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+
+# Sheets への同時リクエスト数を絞る（多人数の同時クリックで 429 の嵐になるのを予防）。
+# Discord 側は discord.py が per-route バケットでレート制御済みなので二重には絞らない。
+_sheets_gate = threading.BoundedSemaphore(4)
+
+# Sheets 側の持続的な障害時は fail-fast する簡易サーキットブレーカー。
+# 開いている間はリトライ 7.5 秒ぶん待たせず即エラー（フレンドリー文言で返る）。
+_BREAKER_THRESHOLD = 5   # この回数連続で 429/5xx なら開く
+_BREAKER_COOLDOWN = 30.0  # 開いてから次のプローブを許すまでの秒数
+_breaker_lock = threading.Lock()
+_breaker_fails = 0
+_breaker_opened_at = 0.0
+
+class SheetsUnavailable(Exception):
+    """サーキットブレーカーが開いている間の即時失敗。"""
+
+def _breaker_allow() -> bool:
+    global _breaker_opened_at
+    with _breaker_lock:
+        if _breaker_opened_at == 0.0:
+            return True
+        if time.monotonic() - _breaker_opened_at < _BREAKER_COOLDOWN:
+            return False
+        _breaker_opened_at = 0.0  # half-open: 次の 1 呼び出しで疎通確認
+        return True
+
+def _breaker_record(ok: bool):
+    global _breaker_fails, _breaker_opened_at
+    with _breaker_lock:
+        if ok:
+            _breaker_fails = 0
+        else:
+            _breaker_fails += 1
+            if _breaker_fails >= _BREAKER_THRESHOLD:
+                _breaker_fails = 0
+                _breaker_opened_at = time.monotonic()
 
 def sheets_call(func: Callable, *args, **kwargs):
     """
-    Sheets API 呼び出しラッパ（429/5xx 対策の指数バックオフ）。
+    Sheets API 呼び出しラッパ（同時実行制限 + 429/5xx 対策の指数バックオフ）。
     """
     delay = 0.5
     for attempt in range(4):
+        if not _breaker_allow():
+            raise SheetsUnavailable("Sheets circuit open; failing fast")
         try:
-            return func(*args, **kwargs)
+            with _sheets_gate:
+                result = func(*args, **kwargs)
+            _breaker_record(True)
+            return result
         except APIError as e:
-            code = getattr(e, "response", None).status_code if hasattr(e, "response") and e.response else None
+            resp = getattr(e, "response", None)
+            code = resp.status_code if resp is not None else None
             if code in (429, 500, 502, 503, 504):
-                time.sleep(delay)
+                _breaker_record(False)
+                # ジッターを掛けて同時クリック組のリトライが同期再衝突しないようにする
+                wait = delay * (1 + random.random() * 0.5)
+                # 429 はサーバーの Retry-After 指示を尊重する
+                retry_after = resp.headers.get("Retry-After") if resp is not None else None
+                if retry_after:
+                    try:
+                        wait = max(wait, float(retry_after))
+                    except ValueError:
+                        pass
+                time.sleep(min(wait, 30.0))
                 delay *= 2
                 continue
             raise
         except Exception:
             raise
-    return func(*args, **kwargs)
+    if not _breaker_allow():
+        raise SheetsUnavailable("Sheets circuit open; failing fast")
+    with _sheets_gate:
+        return func(*args, **kwargs)
+
+_ws_cache_lock = threading.Lock()
 
 def _get_ws(spreadsheet: gspread.Spreadsheet, title: str, create: bool = False) -> gspread.Worksheet:
-    if title in _ws_cache:
-        return _ws_cache[title]
+    ws = _ws_cache.get(title)
+    if ws is not None:
+        return ws
     try:
         ws = sheets_call(spreadsheet.worksheet, title)
     except WorksheetNotFound:
         if not create:
             raise
-        ws = sheets_call(spreadsheet.add_worksheet, title=title, rows=1000, cols=10)
-    _ws_cache[title] = ws
+        try:
+            ws = sheets_call(spreadsheet.add_worksheet, title=title, rows=1000, cols=10)
+        except APIError:
+            # 並走スレッドが一足先に作成済み（重複名エラー）なら既存を引き直す
+            ws = sheets_call(spreadsheet.worksheet, title)
+    with _ws_cache_lock:
+        # 同時ミスした場合も全員が同じハンドルを使う
+        ws = _ws_cache.setdefault(title, ws)
     return ws
 
+# 実際に使う列だけ読む（get_all_values はシート全列 cols=10 を転送してしまう）
+BINDINGS_RANGE = "A:E"   # GuildID..CreatedAtISO
+WALLET_RANGE = "A:C"     # UserName, DiscordID, Wallet
+
+def _read_rows(ws: gspread.Worksheet):
+    rng = BINDINGS_RANGE if ws.title == "bindings" else WALLET_RANGE
+    return sheets_call(ws.get_values, rng)
+
+# シート毎の取得ロック。キャッシュ失効直後に同時クリックが重なっても、
+# 再取得は 1 スレッドだけが行い、残りは結果を待って使い回す（stampede 防止）。
+_fetch_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+
+# シート毎の書き込み世代。書き込み側が invalidate と同時にインクリメントし、
+# 読み側は「取得開始時点の世代のまま」のときだけキャッシュに載せる。
+# これがないと、書き込み前に始まった読みが書き込み後に古いスナップショットを
+# 復活させ、次の末尾オフセット挿入が確定済みの行を潰す。
+_write_gens: Dict[str, int] = defaultdict(int)
+
 def _get_all_values(ws: gspread.Worksheet):
     # bindings は“外部で手動更新”が起きるため必ず最新を取得（キャッシュしない）
     if ws.title == "bindings":
-        return sheets_call(ws.get_all_values)
+        return _read_rows(ws)
 
     key = (ws.title, "all")
-    if key in _values_cache:
-        return _values_cache[key]
-    vals = sheets_call(ws.get_all_values)
-    _values_cache[key] = vals
+    hit = _values_cache.get(key)
+    if hit is not None and hit[0] > time.monotonic():
+        return hit[1]
+    with _fetch_locks[ws.title]:
+        # ロック待ちの間に他スレッドが取得済みならそれを返す
+        hit = _values_cache.get(key)
+        if hit is not None and hit[0] > time.monotonic():
+            return hit[1]
+        gen = _write_gens[ws.title]
+        vals = _read_rows(ws)
+        if _write_gens[ws.title] == gen:
+            _values_cache[key] = (time.monotonic() + VALUES_CACHE_TTL, vals)
     return vals
 
-def _find_row_by_id(ws: gspread.Worksheet, user_id: str):
-    # Force-refresh this sheet once right before reading (avoid showing stale values)
-    _values_cache.pop((ws.title, "all"), None)
+# sheet_name -> (values オブジェクト, {user_id: (row_idx, row)})。values の同一性で鮮度を判定。
+_index_cache: Dict[str, Tuple[Any, Dict[str, Tuple[int, list]]]] = {}
+
+def _index_by_id(rows) -> Dict[str, Tuple[int, list]]:
+    index: Dict[str, Tuple[int, list]] = {}
+    for idx, row in enumerate(rows, start=1):
+        # 重複 ID は先勝ち（従来の線形走査と同じ行を返す）
+        if len(row) >= 2 and row[1] not in index:
+            index[row[1]] = (idx, row)
+    return index
 
+def _find_row_by_id(ws: gspread.Worksheet, user_id: str):
+    # 鮮度は TTL + 書き込み時の明示 invalidate で担保（毎回の再取得はしない）
     values = _get_all_values(ws)
-    for idx, row in enumerate(values, start=1):
-        if len(row) >= 2 and row[1] == user_id:
-            return idx, row
-    return None, None
+    cached = _index_cache.get(ws.title)
+    if cached is None or cached[0] is not values:
+        cached = (values, _index_by_id(values))
+        _index_cache[ws.title] = cached
+    hit = cached[1].get(user_id)
+    return hit if hit else (None, None)
+
+def _append_wallet_row(ws: gspread.Worksheet, row: list):
+    """
+    行追加。直前の read でシート末尾が分かっていれば values.append の
+    tableRange 再スキャンを避けて values.update で直接書く（大きいシートで有利）。
+    """
+    cached = _values_cache.get((ws.title, "all"))
+    # 失効済みの末尾オフセットは信用しない（外部追記された行を潰しかねない）
+    if cached is not None and cached[0] > time.monotonic():
+        next_row = len(cached[1]) + 1
+        try:
+            sheets_call(ws.update, f"A{next_row}:C{next_row}", [row], value_input_option="RAW")
+            return
+        except APIError as e:
+            resp = getattr(e, "response", None)
+            if resp is None or resp.status_code != 400:
+                raise
+            # 400 はグリッド末尾超え（作成時 rows=1000 を使い切った等）。
+            # values.update は行を増やせないので append に切り替える（こちらは拡張してくれる）
+    # 末尾が不明（キャッシュなし/失効）のときは従来どおり append に任せる
+    sheets_call(ws.append_row, row, value_input_option="RAW")
 
 def _lookup_wallet_in_sheet(ws: gspread.Worksheet, user_id: str) -> Tuple[Optional[str], Optional[str]]:
     idx, row = _find_row_by_id(ws, user_id)
@@ -129,19 +270,62 @@ def _lookup_wallet_in_sheet(ws: gspread.Worksheet, user_id: str) -> Tuple[Option
         return (row[0], row[2])
     return (None, None)
 
+# シート毎の書き込みロック。find→write を跨いで直列化しないと、別ユーザー同士の
+# 同時登録が同じ末尾行を計算して片方を黙って上書きする（_fetch_locks とは別物：
+# あちらは _find_row_by_id の先で取得されるため、同じロックだと再入でデッドロックする）。
+_write_locks: Dict[str, threading.Lock] = defaultdict(threading.Lock)
+
 def _upsert_wallet(ws: gspread.Worksheet, user_name: str, user_id: str, wallet: str):
-    idx, row = _find_row_by_id(ws, user_id)
-    if idx:
-        sheets_call(ws.update_cell, idx, 1, user_name)
-        sheets_call(ws.update_cell, idx, 2, user_id)
-        sheets_call(ws.update_cell, idx, 3, wallet)
-    else:
-        sheets_call(ws.append_row, [user_name, user_id, wallet], value_input_option="RAW")
-    _values_cache.pop((ws.title, "all"), None)
+    with _write_locks[ws.title]:
+        idx, row = _find_row_by_id(ws, user_id)
+        if idx:
+            # 3 回の update_cell ではなく 1 回の範囲書き込み（レイテンシ・書き込みクォータとも 1/3）
+            sheets_call(ws.update, f"A{idx}:C{idx}", [[user_name, user_id, wallet]], value_input_option="RAW")
+        else:
+            _append_wallet_row(ws, [user_name, user_id, wallet])
+        # invalidate と世代インクリメントはロック内で対に（飛行中の読みの古い結果を弾く）
+        _values_cache.pop((ws.title, "all"), None)
+        _write_gens[ws.title] += 1
+
+def _ensure_sheet(title: str) -> gspread.Worksheet:
+    return _get_ws(_get_sh(), title, create=True)
+
+# スナップショットのログ行は約 1 秒だけ溜めて append_rows で一括追記する
+# （書き込みクォータ 60/min を同時実行で食い潰さない）。ウォレットの upsert は
+# 「書けた事実」を本人に返す必要があるため、あえてバッチ化しない。
+_log_buffer: list = []
+_log_buffer_lock = threading.Lock()
+
+def _drain_log_rows():
+    with _log_buffer_lock:
+        rows = _log_buffer[:]
+        _log_buffer.clear()
+    if rows:
+        ws = _get_ws(_get_sh(), "log")  # existing snapshot logs
+        sheets_call(ws.append_rows, rows, value_input_option="RAW")
+
+# イベントループはタスクを弱参照でしか保持しないので、flush タスクは完了まで
+# ここで強参照を持つ（でないと sleep 中に GC されてログ行ごと消え得る）
+_log_flush_tasks: set = set()
+
+async def _flush_log_rows_soon():
+    await asyncio.sleep(1.0)
+    await asyncio.to_thread(_drain_log_rows)
+
+def _schedule_log_flush():
+    task = asyncio.create_task(_flush_log_rows_soon())
+    _log_flush_tasks.add(task)
+    task.add_done_callback(_log_flush_tasks.discard)
+
+def _queue_snapshot_log_row(row: list) -> bool:
+    """ログ行を溜める。True を返したら呼び出し側で flush タスクを 1 本だけ起こす。"""
+    with _log_buffer_lock:
+        _log_buffer.append(row)
+        return len(_log_buffer) == 1
 
 # --- Master operations ---
 def _get_master_ws() -> gspread.Worksheet:
-    return _get_ws(sh, MASTER_SHEET, create=True)
+    return _get_ws(_get_sh(), MASTER_SHEET, create=True)
 
 def get_master_wallet(user_id: str) -> Tuple[Optional[str], Optional[str]]:
     ws = _get_master_ws()
@@ -153,129 +337,234 @@ def set_master_wallet(user_name: str, user_id: str, wallet: str):
 
 # --- Event sheet operations ---
 def enroll_in_sheet_only(sheet_name: str, user_name: str, user_id: str, wallet: str):
-    ws = _get_ws(sh, sheet_name, create=True)
+    ws = _get_ws(_get_sh(), sheet_name, create=True)
     _upsert_wallet(ws, user_name, user_id, wallet)
 
+def _prime_wallet_caches(sheet_names):
+    """
+    複数シートの A:C を 1 回の values.batchGet でまとめて取得し、
+    values キャッシュに流し込む（シート数ぶんの HTTP 往復を 1 回に）。
+    """
+    gens = {name: _write_gens[name] for name in sheet_names}
+    resp = sheets_call(_get_sh().values_batch_get, [f"{name}!{WALLET_RANGE}" for name in sheet_names])
+    expires = time.monotonic() + VALUES_CACHE_TTL
+    for name, vr in zip(sheet_names, resp.get("valueRanges", [])):
+        # 取得中に書き込みが入ったシートは載せない（書き込み前のスナップショットの復活防止）
+        if _write_gens[name] == gens[name]:
+            _values_cache[(name, "all")] = (expires, vr.get("values", []))
+
+def _lookup_sheet_and_master(sheet_name: str, user_id: str):
+    """
+    イベントシートとマスターの両方からユーザーを引く。キャッシュが失効している
+    シートは 1 回の values.batchGet でまとめて埋める（クリック毎の 2 往復を 1 往復に）。
+    """
+    ws = _get_ws(_get_sh(), sheet_name, create=True)
+    master = _get_master_ws()
+    stale = []
+    for w in (ws, master):
+        hit = _values_cache.get((w.title, "all"))
+        if hit is None or hit[0] <= time.monotonic():
+            stale.append(w.title)
+    if stale:
+        _prime_wallet_caches(stale)
+    return _lookup_wallet_in_sheet(ws, user_id), _lookup_wallet_in_sheet(master, user_id)
+
 def update_existing_sheets(user_name: str, user_id: str, wallet: str):
-    for s in ALL_WALLET_SHEETS:
-        ws = _get_ws(sh, s, create=True)
+    wss = [_get_ws(_get_sh(), s, create=True) for s in ALL_WALLET_SHEETS]
+    _prime_wallet_caches(ALL_WALLET_SHEETS)
+    # 既存行をキャッシュから解決し、3 シートぶんを 1 回の values.batchUpdate にまとめる
+    data = []
+    for ws in wss:
         idx, _ = _find_row_by_id(ws, user_id)
         if idx:
-            sheets_call(ws.update_cell, idx, 1, user_name)
-            sheets_call(ws.update_cell, idx, 2, user_id)
-            sheets_call(ws.update_cell, idx, 3, wallet)
-            _values_cache.pop((ws.title, "all"), None)
+            data.append({"range": f"{ws.title}!A{idx}:C{idx}", "values": [[user_name, user_id, wallet]]})
+    if data:
+        sheets_call(_get_sh().values_batch_update, {"valueInputOption": "RAW", "data": data})
+        for d in data:
+            title = d["range"].split("!", 1)[0]
+            _values_cache.pop((title, "all"), None)
+            _write_gens[title] += 1
 
 # ========= Bindings (snapshot_bot_log.bindings) =========
 def _get_bindings_ws() -> gspread.Worksheet:
     try:
-        return _get_ws(sh, "bindings", create=False)
+        return _get_ws(_get_sh(), "bindings", create=False)
     except WorksheetNotFound:
-        ws = _get_ws(sh, "bindings", create=True)
+        ws = _get_ws(_get_sh(), "bindings", create=True)
         sheets_call(ws.append_row, ["GuildID", "ChannelID", "MessageID", "SheetName", "CreatedAtISO"], value_input_option="RAW")
         return ws
 
-def _is_sheet_already_bound(guild_id: int, sheet_name: str) -> bool:
+# bindings は 1 回の読みでインデックス化してキャッシュ（クリック毎の全シート取得をやめる）。
+# 手動編集は TTL 失効で、自前の追記は明示 invalidate で反映される。
+BINDINGS_CACHE_TTL = 15.0
+_bindings_cache: Optional[Tuple[float, Dict[str, Tuple[int, int, str]], set, Dict[str, list]]] = None
+
+def _invalidate_bindings_cache():
+    global _bindings_cache
+    _bindings_cache = None
+
+def _load_bindings():
+    global _bindings_cache
+    cached = _bindings_cache
+    if cached is not None and cached[0] > time.monotonic():
+        return cached
     ws = _get_bindings_ws()
-    # ここはキャッシュを使わず常に最新を確認
-    for row in sheets_call(ws.get_all_values)[1:]:
-        if len(row) >= 4 and row[0] == str(guild_id) and row[3] == sheet_name:
-            return True
-    return False
+    by_msg: Dict[str, Tuple[int, int, str]] = {}
+    bound_sheets = set()  # (guild_id_str, sheet_name)
+    by_guild: Dict[str, list] = {}  # guild_id_str -> [record, ...]
+    for row in _read_rows(ws)[1:]:
+        if len(row) >= 4:
+            try:
+                record = {
+                    "guild_id": int(row[0]),
+                    "channel_id": int(row[1]),
+                    "message_id": int(row[2]),
+                    "sheet_name": row[3],
+                    "created_at": row[4] if len(row) > 4 else "",
+                }
+            except ValueError:
+                continue  # ヘッダー行や手で壊された行はスキップ
+            by_msg.setdefault(row[2], (record["guild_id"], record["channel_id"], row[3]))
+            bound_sheets.add((row[0], row[3]))
+            by_guild.setdefault(row[0], []).append(record)
+    cached = (time.monotonic() + BINDINGS_CACHE_TTL, by_msg, bound_sheets, by_guild)
+    _bindings_cache = cached
+    return cached
+
+def _is_sheet_already_bound(guild_id: int, sheet_name: str) -> bool:
+    return (str(guild_id), sheet_name) in _load_bindings()[2]
 
 def _get_binding_record(guild_id: int, sheet_name: str):
-    ws = _get_bindings_ws()
-    for row in sheets_call(ws.get_all_values)[1:]:
-        if len(row) >= 4 and row[0] == str(guild_id) and row[3] == sheet_name:
-            return {
-                "guild_id": int(row[0]),
-                "channel_id": int(row[1]),
-                "message_id": int(row[2]),
-                "sheet_name": row[3],
-                "created_at": row[4] if len(row) > 4 else ""
-            }
+    for record in _load_bindings()[3].get(str(guild_id), []):
+        if record["sheet_name"] == sheet_name:
+            return record
     return None
 
+@functools.lru_cache(maxsize=1)
+def _iso_now(bucket: int) -> str:
+    # 同一秒内の連続追加で isoformat 文字列を使い回す（utcnow は deprecated なので aware に）
+    return datetime.now(timezone.utc).isoformat()
+
 def _add_binding(guild_id: int, channel_id: int, message_id: int, sheet_name: str):
     ws = _get_bindings_ws()
-    sheets_call(ws.append_row, [str(guild_id), str(channel_id), str(message_id), sheet_name, datetime.utcnow().isoformat()], value_input_option="RAW")
-    _values_cache.pop((ws.title, "all"), None)
+    sheets_call(ws.append_row, [str(guild_id), str(channel_id), str(message_id), sheet_name, _iso_now(int(time.time()))], value_input_option="RAW")
+    _invalidate_bindings_cache()
+
+# message_id -> binding の永続メモ。バインドは作成後に変更されないので
+# 正ヒットだけ無期限にキャッシュできる（未ヒットは登録直後の競合があり得るため都度引く）。
+_binding_memo: Dict[str, Tuple[int, int, str]] = {}
 
 def _get_binding_by_message(message_id: int):
-    ws = _get_bindings_ws()
-    for row in _get_all_values(ws)[1:]:
-        if len(row) >= 3 and row[2] == str(message_id):
-            return int(row[0]), int(row[1]), row[3]
-    return None
+    mid = str(message_id)
+    hit = _binding_memo.get(mid)
+    if hit is None:
+        hit = _load_bindings()[1].get(mid)
+        if hit is not None:
+            _binding_memo[mid] = hit
+    return hit
 
 def _list_bindings_for_guild(guild_id: int):
-    ws = _get_bindings_ws()
-    out = []
-    for row in _get_all_values(ws)[1:]:
-        if len(row) >= 5 and row[0] == str(guild_id):
-            out.append({
-                "guild_id": int(row[0]),
-                "channel_id": int(row[1]),
-                "message_id": int(row[2]),
-                "sheet_name": row[3],
-                "created_at": row[4],
-            })
-    return out
+    return _load_bindings()[3].get(str(guild_id), [])
 
 # ========= Snapshot (existing) =========
 class SnapshotCog(commands.Cog):
-    def __init__(self, bot): self.bot = bot
+    def __init__(self, bot):
+        self.bot = bot
+        self._http: Optional[aiohttp.ClientSession] = None
+
+    async def _session(self) -> aiohttp.ClientSession:
+        # コマンド毎にセッションを作らず TCP/TLS コネクションを使い回す
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=30))
+        return self._http
+
+    async def cog_unload(self):
+        if self._http and not self._http.closed:
+            await self._http.close()
+        # 終了間際に積まれたログ行を取りこぼさない
+        await asyncio.to_thread(_drain_log_rows)
 
     @app_commands.command(name="snapshot", description="Fetch token holder info for a contract address (ephemeral).")
     @app_commands.describe(contract_address="Enter the token contract address")
     async def snapshot(self, interaction: discord.Interaction, contract_address: str):
         await interaction.response.defer(ephemeral=True)
-        progress_message = await interaction.followup.send(content="Fetching token holders... (page 1)", ephemeral=True)
+        await interaction.followup.send(content="Fetching token holders...", ephemeral=True)
         try:
             base_url = "https://api.socialscan.io/monad-testnet/v1/developer/api"
-            module, action, offset, page = "token", "tokenholderlist", 100, 1
-            all_holders, max_consecutive_errors, error_count, max_holders = [], 5, 0, 1000
-
-            while True:
-                await progress_message.edit(content=f"Now reading page {page}...")
-                params = {"module": module, "action": action, "contractaddress": contract_address,
-                          "page": page, "offset": offset, "apikey": API_KEY}
-                response = requests.get(base_url, params=params)
-                if response.status_code != 200:
-                    error_count += 1
-                    if error_count >= max_consecutive_errors: break
-                    time.sleep(0.5); continue
-                data = response.json()
-                if data.get("status") != "1":
-                    error_count += 1
-                    if error_count >= max_consecutive_errors: break
-                    time.sleep(0.5); continue
-                else:
-                    error_count = 0
-                result_list = data.get("result")
-                if not result_list: break
+            offset, max_holders = 100, 1000
+            max_pages = max_holders // offset
+            base_params = {"module": "token", "action": "tokenholderlist",
+                           "contractaddress": contract_address, "offset": offset, "apikey": API_KEY}
+
+            # ページを同時 4 本まで並行取得（逐次 GET + sleep(0.5) の置き換え）
+            semaphore = asyncio.Semaphore(4)
+
+            async def fetch_page(session: aiohttp.ClientSession, page: int):
+                params = dict(base_params, page=page)
+                async with semaphore:
+                    delay = 0.5
+                    for _ in range(4):
+                        try:
+                            async with session.get(base_url, params=params) as resp:
+                                if resp.status == 429:
+                                    # サーバー指示があれば固定バックオフより優先する
+                                    retry_after = resp.headers.get("Retry-After")
+                                    if retry_after:
+                                        try:
+                                            delay = max(delay, float(retry_after))
+                                        except ValueError:
+                                            pass
+                                elif resp.status == 200:
+                                    raw = await resp.read()
+                                    data = orjson.loads(raw) if orjson else json.loads(raw)
+                                    if data.get("status") == "1":
+                                        return data.get("result") or []
+                                    # 整形済み応答の status != "1" は「データなし」の確定回答。
+                                    # リトライ梯子（計 7.5 秒 + セマフォ占有）に落とさず即返す
+                                    return []
+                        except (aiohttp.ClientError, asyncio.TimeoutError):
+                            pass
+                        await asyncio.sleep(delay)
+                        delay *= 2
+                    return None  # このページは取得失敗
+
+            session = await self._session()
+            tasks = [fetch_page(session, p) for p in range(1, max_pages + 1)]
+            results = await asyncio.gather(*tasks)
+
+            holders = {}
+            for result_list in results:
+                if result_list is None: break  # 欠けたページ以降は信用しない
                 for holder in result_list:
-                    all_holders.append((holder["TokenHolderAddress"], float(holder["TokenHolderQuantity"])))
-                    if len(all_holders) >= max_holders: break
-                if len(all_holders) >= max_holders or len(result_list) < offset: break
-                page += 1; time.sleep(0.5)
-
-            total_supply = int(sum(q for _, q in all_holders))
-            total_holders = len(all_holders)
-            csv_buffer = io.StringIO()
-            writer = csv.writer(csv_buffer)
-            writer.writerow(["TokenHolderAddress", "TokenHolderQuantity"])
-            for address, q in all_holders:
-                writer.writerow([address, str(int(q))])
-            csv_buffer.seek(0)
+                    # 同一アドレスはここで集約（挿入順維持なので出力順は安定）
+                    address = holder["TokenHolderAddress"]
+                    if address not in holders:
+                        # 上限はユニークアドレス数に掛かる。到達後も既出分の集約は続ける
+                        # （ページ末尾の重複を捨てると total_supply を取りこぼす）
+                        if len(holders) >= max_holders:
+                            continue
+                        holders[address] = 0
+                    # float 経由だと 2^53 超の残高で精度が落ちるので整数のまま足す
+                    raw_qty = holder["TokenHolderQuantity"]
+                    qty = int(raw_qty.split(".", 1)[0] or "0") if isinstance(raw_qty, str) else int(raw_qty)
+                    holders[address] += qty
+                if len(holders) >= max_holders or len(result_list) < offset: break
+
+            total_supply = sum(holders.values())
+            total_holders = len(holders)
+            # アドレスと整数量にカンマ/引用符は入らないので csv.writer を介さず直接組み立てる
+            lines = ["TokenHolderAddress,TokenHolderQuantity"]
+            lines.extend(f"{address},{q}" for address, q in holders.items())
+            csv_payload = "\n".join(lines).encode("utf-8")
 
             summary = (f"**Contract Address**: {contract_address}\n"
                        f"**Total Holders**: {total_holders} (up to {max_holders})\n"
                        f"**Total Supply**: {total_supply}\n\nYour CSV file is attached below.")
-            sheets_call(worksheet.append_row, [str(interaction.user), contract_address, str(total_holders), str(total_supply)], value_input_option="RAW")
-            await progress_message.edit(content="Snapshot completed! Sending file...")
+            # ログはキューに積むだけ（ユーザー応答は Sheets 書き込みを待たない）
+            if _queue_snapshot_log_row([str(interaction.user), contract_address, str(total_holders), str(total_supply)]):
+                _schedule_log_flush()
             await interaction.followup.send(content=summary, ephemeral=True,
-                                            file=discord.File(fp=io.StringIO(csv_buffer.getvalue()), filename="holderList.csv"))
+                                            file=discord.File(fp=io.BytesIO(csv_payload), filename="holderList.csv"))
         except Exception as e:
             await send_friendly_error(interaction, e)
 
@@ -293,18 +582,32 @@ class RoleExport(commands.Cog):
                                   role2: discord.Role | None = None, role3: discord.Role | None = None):
         await interaction.response.defer(ephemeral=True)
         try:
-            await interaction.guild.chunk()
+            # 取得済みならゲートウェイへの全メンバー再要求をスキップ
+            if not interaction.guild.chunked:
+                await interaction.guild.chunk()
             roles = [r for r in [role, role2, role3] if r]
-            matched_map, member_set = {}, set()
+            # メンバー集合と一致ロール表を 1 つの dict に統合（ロールは高々 3 つなので list で足りる）。
+            # ロール側を名前順で回せば各メンバーの一致リストは最初からソート済みになり、
+            # 行ごとの sorted() が要らなくなる。
+            roles.sort(key=operator.attrgetter("name"))
+            matched: Dict[discord.Member, list] = {}
             for r in roles:
                 for m in r.members:
-                    member_set.add(m); matched_map.setdefault(m.id, set()).add(r.name)
-            buf = io.StringIO(); w = csv.writer(buf); w.writerow(["UserName", "DiscordID", "RolesMatched"])
-            for m in sorted(member_set, key=lambda x: (x.name, x.id)):
-                w.writerow([m.name, str(m.id), ",".join(sorted(matched_map.get(m.id, [])))])
-            buf.seek(0)
-            file = discord.File(fp=io.StringIO(buf.getvalue()), filename=f"members_{'-'.join([r.name for r in roles])}.csv")
-            await interaction.followup.send(content=f"Exported **{len(member_set)}** members.", ephemeral=True, file=file)
+                    names = matched.setdefault(m, [])
+                    if r.name not in names:
+                        names.append(r.name)
+            # BytesIO に直接書き、getvalue()→StringIO の二重コピーを避ける
+            payload = io.BytesIO()
+            text = io.TextIOWrapper(payload, encoding="utf-8", newline="")
+            w = csv.writer(text); w.writerow(["UserName", "DiscordID", "RolesMatched"])
+            # 属性アクセスとロール名の join はタプル構築時の 1 回だけ。
+            # ソートは C レベルの itemgetter、行出力は writerows でまとめて。
+            rows = [(m.name, m.id, ",".join(names)) for m, names in matched.items()]
+            rows.sort(key=operator.itemgetter(0, 1))
+            w.writerows((name, str(mid), roles) for name, mid, roles in rows)
+            text.flush(); payload.seek(0)
+            file = discord.File(fp=payload, filename=f"members_{'-'.join([r.name for r in roles])}.csv")
+            await interaction.followup.send(content=f"Exported **{len(matched)}** members.", ephemeral=True, file=file)
         except discord.Forbidden:
             await interaction.followup.send(content="Missing **Server Members Intent**.", ephemeral=True)
         except Exception as e:
@@ -345,130 +648,148 @@ class RegisterOrChangeWalletModal(discord.ui.Modal):
             user_id = str(interaction.user.id)
             new_wallet = self.wallet_input.value.strip()
 
-            if self.is_change:
-                set_master_wallet(user_name, user_id, new_wallet)
-                update_existing_sheets(user_name, user_id, new_wallet)
-                await interaction.response.send_message(
-                    content=f"✅ Wallet changed to **{new_wallet}**\n**User**: {user_name} (updated where you were already enrolled)",
-                    ephemeral=True
-                )
-            else:
-                enroll_in_sheet_only(self.sheet_name, user_name, user_id, new_wallet)
-                set_master_wallet(user_name, user_id, new_wallet)
-                await interaction.response.send_message(
-                    content=f"✅ Registration completed.\n**User**: {user_name}\n**Wallet**: {new_wallet}",
-                    ephemeral=True
-                )
+            async with _user_locks[user_id]:
+                if self.is_change:
+                    # マスターとイベントシートは別シートなので並行更新できる
+                    await asyncio.gather(
+                        asyncio.to_thread(set_master_wallet, user_name, user_id, new_wallet),
+                        asyncio.to_thread(update_existing_sheets, user_name, user_id, new_wallet),
+                    )
+                    await interaction.response.send_message(
+                        content=f"✅ Wallet changed to **{new_wallet}**\n**User**: {user_name} (updated where you were already enrolled)",
+                        ephemeral=True
+                    )
+                else:
+                    await asyncio.to_thread(enroll_in_sheet_only, self.sheet_name, user_name, user_id, new_wallet)
+                    await asyncio.to_thread(set_master_wallet, user_name, user_id, new_wallet)
+                    await interaction.response.send_message(
+                        content=f"✅ Registration completed.\n**User**: {user_name}\n**Wallet**: {new_wallet}",
+                        ephemeral=True
+                    )
         except Exception as e:
             await send_friendly_error(interaction, e)
 
+# 連打（ダブルクリック）で同一ユーザーのハンドラが並走し、重複書き込みになるのを防ぐ
+_user_locks: Dict[str, asyncio.Lock] = defaultdict(asyncio.Lock)
+
 class WalletHubView(discord.ui.View):
     """3 buttons bound to a specific sheet; optional auto-enroll on any button."""
-    def __init__(self):
+    def __init__(self, sheet_name: Optional[str] = None):
         super().__init__(timeout=None)
-
-    def _bound_sheet(self, interaction: discord.Interaction) -> str:
-        binding = _get_binding_by_message(interaction.message.id)
+        # シート名を custom_id に焼き込む。クリック時の bindings 照会が不要になり、
+        # 再起動後も setup_bot の add_view だけでボタンが生き返る。
+        if sheet_name:
+            for child, action in zip(self.children, ("register", "check", "change")):
+                child.custom_id = f"wallet:{sheet_name}:{action}"
+
+    async def _bound_sheet(self, interaction: discord.Interaction) -> str:
+        custom_id = (interaction.data or {}).get("custom_id", "")
+        if custom_id.startswith("wallet:"):
+            return custom_id.split(":", 2)[1]
+        # custom_id 焼き込み前に設置された旧メッセージは従来どおり bindings から引く
+        binding = await asyncio.to_thread(_get_binding_by_message, interaction.message.id)
         if not binding:
             raise RuntimeError("No binding for this message.")
         return binding[2]
 
-    async def _maybe_auto_enroll_from_master(self, sheet: str, user_name: str, user_id: str) -> Tuple[bool, Optional[str], Optional[str]]:
-        m_name, m_wallet = get_master_wallet(user_id)
+    async def _maybe_auto_enroll_from_master(self, sheet: str, user_name: str, user_id: str,
+                                             m_name: Optional[str], m_wallet: Optional[str]) -> Tuple[bool, Optional[str], Optional[str]]:
+        # マスターの照会結果は呼び出し側のバッチ取得を使い回す（ここでは再照会しない）
         if not m_wallet:
-            return False, None, None
+            return False, m_name, m_wallet
         if not AUTO_ENROLL_FROM_MASTER_ON_ANY_BUTTON:
             return False, m_name, m_wallet
-        enroll_in_sheet_only(sheet, m_name or user_name, user_id, m_wallet)
+        await asyncio.to_thread(enroll_in_sheet_only, sheet, m_name or user_name, user_id, m_wallet)
         return True, m_name or user_name, m_wallet
 
     @discord.ui.button(label="Register wallet", style=discord.ButtonStyle.primary, row=0)  # 青
     async def btn_register(self, interaction: discord.Interaction, button: discord.ui.Button):
         try:
-            sheet = self._bound_sheet(interaction)
-            user_name, user_id = str(interaction.user), str(interaction.user.id)
-
-            ws = _get_ws(sh, sheet, create=True)
-            s_name, s_wallet = _lookup_wallet_in_sheet(ws, user_id)
-            if s_wallet:
-                await interaction.response.send_message(
-                    content=f"📝 Already submitted here.\n**User**: {s_name}\n**Wallet**: {s_wallet}",
-                    ephemeral=True
-                ); return
-
-            m_name, m_wallet = get_master_wallet(user_id)
-            if m_wallet:
-                enroll_in_sheet_only(sheet, m_name or user_name, user_id, m_wallet)
-                await interaction.response.send_message(
-                    content=f"✅ Synced from your master record.\n**User**: {m_name or user_name}\n**Wallet**: {m_wallet}",
-                    ephemeral=True
-                ); return
-
-            await interaction.response.send_modal(RegisterOrChangeWalletModal(sheet, preset_wallet="", is_change=False, user_name=user_name))
+            async with _user_locks[str(interaction.user.id)]:
+                sheet = await self._bound_sheet(interaction)
+                user_name, user_id = str(interaction.user), str(interaction.user.id)
+
+                (s_name, s_wallet), (m_name, m_wallet) = await asyncio.to_thread(_lookup_sheet_and_master, sheet, user_id)
+                if s_wallet:
+                    await interaction.response.send_message(
+                        content=f"📝 Already submitted here.\n**User**: {s_name}\n**Wallet**: {s_wallet}",
+                        ephemeral=True
+                    ); return
+
+                if m_wallet:
+                    await asyncio.to_thread(enroll_in_sheet_only, sheet, m_name or user_name, user_id, m_wallet)
+                    await interaction.response.send_message(
+                        content=f"✅ Synced from your master record.\n**User**: {m_name or user_name}\n**Wallet**: {m_wallet}",
+                        ephemeral=True
+                    ); return
+
+                await interaction.response.send_modal(RegisterOrChangeWalletModal(sheet, preset_wallet="", is_change=False, user_name=user_name))
         except Exception as e:
             await send_friendly_error(interaction, e)
 
     @discord.ui.button(label="Check wallet", style=discord.ButtonStyle.success, row=0)  # 緑
     async def btn_check(self, interaction: discord.Interaction, button: discord.ui.Button):
         try:
-            sheet = self._bound_sheet(interaction)
-            user_name, user_id = str(interaction.user), str(interaction.user.id)
-
-            ws = _get_ws(sh, sheet, create=True)
-            s_name, s_wallet = _lookup_wallet_in_sheet(ws, user_id)
-            if s_wallet:
-                await interaction.response.send_message(content=f"**User**: {s_name}\n**Wallet**: {s_wallet}", ephemeral=True); return
-
-            enrolled, name, wal = await self._maybe_auto_enroll_from_master(sheet, user_name, user_id)
-            if enrolled:
-                await interaction.response.send_message(
-                    content=f"✅ Enrolled here from your master record.\n**User**: {name}\n**Wallet**: {wal}",
-                    ephemeral=True
-                ); return
-
-            m_name, m_wallet = get_master_wallet(user_id)
-            if m_wallet:
-                await interaction.response.send_message(
-                    content=(f"Not registered in this list yet.\n"
-                             f"Master record:\n**User**: {m_name}\n**Wallet**: {m_wallet}"),
-                    ephemeral=True
-                )
-            else:
-                await interaction.response.send_message(content="No wallet found. Please register first.", ephemeral=True)
-        except Exception as e:
-            await send_friendly_error(interaction, e)
-
-    @discord.ui.button(label="Change wallet", style=discord.ButtonStyle.danger, row=0)  # 赤
-    async def btn_change(self, interaction: discord.Interaction, button: discord.ui.Button):
-        try:
-            sheet = self._bound_sheet(interaction)
-            user_name, user_id = str(interaction.user), str(interaction.user.id)
+            # Sheets が遅くても 3 秒の応答期限を踏まないよう先に ACK（モーダルは出さないので defer 可）
+            await interaction.response.defer(ephemeral=True)
+            async with _user_locks[str(interaction.user.id)]:
+                sheet = await self._bound_sheet(interaction)
+                user_name, user_id = str(interaction.user), str(interaction.user.id)
 
-            ws = _get_ws(sh, sheet, create=True)
-            s_name, s_wallet = _lookup_wallet_in_sheet(ws, user_id)
+                (s_name, s_wallet), (m_name, m_wallet) = await asyncio.to_thread(_lookup_sheet_and_master, sheet, user_id)
+                if s_wallet:
+                    await interaction.followup.send(content=f"**User**: {s_name}\n**Wallet**: {s_wallet}", ephemeral=True); return
 
-            if not s_wallet:
-                enrolled, name, wal = await self._maybe_auto_enroll_from_master(sheet, user_name, user_id)
+                enrolled, m_name, m_wallet = await self._maybe_auto_enroll_from_master(sheet, user_name, user_id, m_name, m_wallet)
                 if enrolled:
-                    s_name, s_wallet = name, wal
+                    await interaction.followup.send(
+                        content=f"✅ Enrolled here from your master record.\n**User**: {m_name}\n**Wallet**: {m_wallet}",
+                        ephemeral=True
+                    ); return
 
-            if not s_wallet:
-                m_name, m_wallet = get_master_wallet(user_id)
                 if m_wallet:
-                    await interaction.response.send_message(
+                    await interaction.followup.send(
                         content=(f"Not registered in this list yet.\n"
                                  f"Master record:\n**User**: {m_name}\n**Wallet**: {m_wallet}"),
                         ephemeral=True
                     )
                 else:
-                    await interaction.response.send_message(content="No wallet found. Please register first.", ephemeral=True)
-                return
+                    await interaction.followup.send(content="No wallet found. Please register first.", ephemeral=True)
+        except Exception as e:
+            await send_friendly_error(interaction, e)
 
-            msg = f"Current wallet: **{s_wallet}**\nProceed to change?"
-            await interaction.response.send_message(
-                content=msg, ephemeral=True,
-                view=ConfirmChangeView(sheet, current_wallet=s_wallet, user_name=s_name or user_name)
-            )
+    @discord.ui.button(label="Change wallet", style=discord.ButtonStyle.danger, row=0)  # 赤
+    async def btn_change(self, interaction: discord.Interaction, button: discord.ui.Button):
+        try:
+            # モーダルは ConfirmChangeView 側で出すため、ここは defer してよい
+            await interaction.response.defer(ephemeral=True)
+            async with _user_locks[str(interaction.user.id)]:
+                sheet = await self._bound_sheet(interaction)
+                user_name, user_id = str(interaction.user), str(interaction.user.id)
+
+                (s_name, s_wallet), (m_name, m_wallet) = await asyncio.to_thread(_lookup_sheet_and_master, sheet, user_id)
+
+                if not s_wallet:
+                    enrolled, m_name, m_wallet = await self._maybe_auto_enroll_from_master(sheet, user_name, user_id, m_name, m_wallet)
+                    if enrolled:
+                        s_name, s_wallet = m_name, m_wallet
+
+                if not s_wallet:
+                    if m_wallet:
+                        await interaction.followup.send(
+                            content=(f"Not registered in this list yet.\n"
+                                     f"Master record:\n**User**: {m_name}\n**Wallet**: {m_wallet}"),
+                            ephemeral=True
+                        )
+                    else:
+                        await interaction.followup.send(content="No wallet found. Please register first.", ephemeral=True)
+                    return
+
+                msg = f"Current wallet: **{s_wallet}**\nProceed to change?"
+                await interaction.followup.send(
+                    content=msg, ephemeral=True,
+                    view=ConfirmChangeView(sheet, current_wallet=s_wallet, user_name=s_name or user_name)
+                )
         except Exception as e:
             await send_friendly_error(interaction, e)
 
@@ -491,7 +812,7 @@ class WalletHub(commands.Cog):
         await interaction.response.defer(ephemeral=True)
         try:
             sheet_name = _sheet_from_button_number(button_number)
-            exists = _is_sheet_already_bound(interaction.guild_id, sheet_name)
+            exists = await asyncio.to_thread(_is_sheet_already_bound, interaction.guild_id, sheet_name)
 
             if exists and not edit_if_exists:
                 await interaction.followup.send(content=f"❌ Binding already exists for **{sheet_name}**.", ephemeral=True)
@@ -499,7 +820,7 @@ class WalletHub(commands.Cog):
 
             if exists and edit_if_exists:
                 # 既存メッセージを編集してボタンを復旧
-                rec = _get_binding_record(interaction.guild_id, sheet_name)
+                rec = await asyncio.to_thread(_get_binding_record, interaction.guild_id, sheet_name)
                 if not rec:
                     await interaction.followup.send(content="Binding record not found. Please re-create.", ephemeral=True)
                     return
@@ -507,14 +828,14 @@ class WalletHub(commands.Cog):
                 try:
                     target_ch = channel if channel.id == rec["channel_id"] else await bot.fetch_channel(rec["channel_id"])
                     target_msg = await target_ch.fetch_message(rec["message_id"])
-                    await target_msg.edit(view=WalletHubView())  # 画像や本文はそのまま、ボタンだけ復旧
+                    await target_msg.edit(view=WalletHubView(sheet_name))  # 画像や本文はそのまま、ボタンだけ復旧
                     await interaction.followup.send(content=f"✅ Refreshed buttons for **{sheet_name}**.", ephemeral=True)
                 except Exception as e:
                     await send_friendly_error(interaction, e)
                 return
 
             # 新規設置
-            _get_ws(sh, sheet_name, create=True)  # ensure exists
+            await asyncio.to_thread(_ensure_sheet, sheet_name)  # ensure exists
 
             embed = discord.Embed(
                 title="Wallet Center",
@@ -525,9 +846,9 @@ class WalletHub(commands.Cog):
             file = discord.File(EMBED_IMAGE_PATH, filename="C_logo.png") if os.path.exists(EMBED_IMAGE_PATH) else None
             if file: embed.set_thumbnail(url="attachment://C_logo.png")
 
-            view = WalletHubView()
+            view = WalletHubView(sheet_name)
             msg = await (channel.send(embed=embed, view=view, file=file) if file else channel.send(embed=embed, view=view))
-            _add_binding(interaction.guild_id, channel.id, msg.id, sheet_name)
+            await asyncio.to_thread(_add_binding, interaction.guild_id, channel.id, msg.id, sheet_name)
             await interaction.followup.send(content=f"✅ Posted wallet hub in {channel.mention} (bound to **{sheet_name}**).", ephemeral=True)
 
         except Exception as e:
@@ -545,7 +866,7 @@ class AdminDiagnostics(commands.Cog):
     async def check_sheet_binding(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
         try:
-            bindings = _list_bindings_for_guild(interaction.guild_id)
+            bindings = await asyncio.to_thread(_list_bindings_for_guild, interaction.guild_id)
             if not bindings:
                 await interaction.followup.send(content="No bindings found in this server.", ephemeral=True); return
             embed = discord.Embed(title="Current Wallet Button Bindings",
@@ -568,6 +889,9 @@ async def setup_bot():
     await bot.add_cog(RoleExport(bot))      # role export
     await bot.add_cog(WalletHub(bot))       # unified wallet hub
     await bot.add_cog(AdminDiagnostics(bot))# diagnostics
+    # custom_id が固定になったので、再起動後もボタンを受けられるよう永続 view を登録
+    for sheet_name in ALL_WALLET_SHEETS:
+        bot.add_view(WalletHubView(sheet_name))
     await bot.tree.sync()
 
 @bot.event